@@ -1,7 +1,38 @@
 # Bernstein-Vazirani algorithm implementation with Qiskit
 # Main resource used: https://qiskit.org/textbook/ch-algorithms/bernstein-vazirani.html
 
+import functools
+import os
+import numpy as np
 import qiskit
+from qiskit.providers.aer import AerSimulator
+
+
+# Simulator backend, created once and shared by every simulation
+_QASM_SIM = qiskit.Aer.get_backend('aer_simulator')
+# Simulator used for batches of circuits, running the experiments of a job in parallel
+_BATCH_SIM = AerSimulator(max_parallel_experiments=os.cpu_count())
+
+
+@functools.lru_cache(maxsize=None)
+def _ibmq_provider():
+    """ Loads the IBMQ account once and returns the provider. """
+    qiskit.providers.ibmq.IBMQ.load_account()
+    return qiskit.providers.ibmq.IBMQ.get_provider(hub='ibm-q')
+
+
+@functools.lru_cache(maxsize=128)
+def _transpile_cached(qasm: str, backend_name: str, level: int, best_of: int = 1) -> qiskit.QuantumCircuit:
+    """ 
+        Transpiles the circuit described by the given QASM string, so that repeated runs of the same circuit skip the transpiler.
+        The transpiler is stochastic, so it is run best_of times with different seeds (Qiskit runs them in parallel) and the shallowest circuit is kept.
+    """
+    circuit = qiskit.QuantumCircuit.from_qasm_str(qasm)
+    backend = _ibmq_provider().get_backend(backend_name)
+    candidates = qiskit.transpile([circuit]*best_of, backend, optimization_level=level, seed_transpiler=list(range(best_of)))
+
+    # Keep the circuit with the lowest depth, using the number of CNOTs to break ties
+    return min(candidates, key=lambda c: (c.depth(), c.count_ops().get('cx', 0)))
 
 
 class BernsteinVazirani():
@@ -14,6 +45,8 @@ class BernsteinVazirani():
         
         self.n = num_qubits
         self.bitstring = bitstring
+        # Simulator used by simulation(), shared between instances
+        self._sim = _QASM_SIM
 
     def algorithm(self, draw: bool = False) -> qiskit.QuantumCircuit:
         """ Returns the circuit for performing the Bernstein-Vazirani algorithm. """
@@ -30,30 +63,30 @@ class BernsteinVazirani():
         circuit.z(self.n)
 
         # Apply Hadamard gates
-        for qubit in range(self.n):
-            circuit.h(qubit)
+        circuit.h(range(self.n))
 
         # Apply visual barrier 
         circuit.barrier()
 
         # Apply the inner product oracle
-        s = self.bitstring[::-1]  # Reverse bitstring to fit qiskit's qubit ordering
-        for qubit in range(self.n):
-            if s[qubit] == '0':
-                circuit.i(qubit)
-            else:
-                circuit.cx(qubit, self.n)
+        # Mask of the qubits whose bit is 1 (bitstring is reversed to fit qiskit's qubit ordering)
+        mask = np.frombuffer(self.bitstring[::-1].encode(), dtype=np.uint8) == ord('1')
+        active_qubits = np.flatnonzero(mask).tolist()
+        idle_qubits = np.flatnonzero(~mask).tolist()
+        # Broadcasting over an empty list raises, so all-zero and all-one bitstrings skip one of the calls
+        if idle_qubits:
+            circuit.i(idle_qubits)
+        if active_qubits:
+            circuit.cx(active_qubits, [self.n]*len(active_qubits))
 
         # Apply visual barrier 
         circuit.barrier()
             
         # Apply Hadamard gates
-        for qubit in range(self.n):
-            circuit.h(qubit)
+        circuit.h(range(self.n))
 
         # Measurement
-        for qubit in range(self.n):
-            circuit.measure(qubit, qubit)
+        circuit.measure(range(self.n), range(self.n))
 
         # Print and draw circuit if requested
         if draw:
@@ -64,11 +97,8 @@ class BernsteinVazirani():
 
     def simulation(self, circuit: qiskit.QuantumCircuit, plot: bool = False):
         """ Performs simulation on the given circuit. """
-        # Get simulator and serialize qobj
-        qasm_sim = qiskit.Aer.get_backend('qasm_simulator')
-        qobj = qiskit.assemble(circuit)
         # Get results
-        results = qasm_sim.run(qobj).result()
+        results = self._sim.run(circuit).result()
         answer = results.get_counts()
 
         # Plot histogram if requested
@@ -77,16 +107,23 @@ class BernsteinVazirani():
 
         return answer
 
-    def run_quantum_hardware(self, circuit: qiskit.QuantumCircuit, plot: bool = False):
-        """ Run the given circuit on the IBM quantum hardware in the cloud. """
+    @staticmethod
+    def simulate_batch(circuits: list, shots: int = 1024) -> list:
+        """ Performs simulation on all the given circuits in a single job and returns the counts of each circuit, in the same order. """
+        # Get results
+        results = _BATCH_SIM.run(circuits, shots=shots).result()
+
+        return [results.get_counts(i) for i in range(len(circuits))]
+
+    def run_quantum_hardware(self, circuit: qiskit.QuantumCircuit, plot: bool = False, best_of: int = 5):
+        """ Run the given circuit on the IBM quantum hardware in the cloud, keeping the shallowest of best_of transpilations. """
         # Load IBMQ account and get the least busy backend device with greater than or equal to (n+1) qubits
-        qiskit.providers.ibmq.IBMQ.load_account()
-        provider = qiskit.providers.ibmq.IBMQ.get_provider(hub='ibm-q')
+        provider = _ibmq_provider()
         backend = qiskit.providers.ibmq.least_busy(provider.backends(filters=lambda x: x.configuration().n_qubits >= (self.num_bits+1) and not x.configuration().simulator and x.status().operational == True))
         print('Least busy backend:', backend)
 
         # Run circuit on the least busy backend and monitor the execution of the job in the queue
-        transpiled_circuit = qiskit.compiler.transpiler.transpile(circuit, backend, optimization_level=3)
+        transpiled_circuit = _transpile_cached(circuit.qasm(), backend.name(), 3, best_of)
         qobj = qiskit.compiler.assembler.assemble(transpiled_circuit, backend)
         job = backend.run(qobj)
         qiskit.tools.monitor.job_monitor(job, interval=2)
@@ -0,0 +1,39 @@
+# Tests for the Bernstein-Vazirani algorithm implementation with Qiskit
+
+import pytest
+
+pytest.importorskip('qiskit')
+
+from BV_qiskit import BernsteinVazirani
+
+
+@pytest.mark.parametrize('bitstring', ['000', '111', '101', '1', '0'])
+def test_simulation_recovers_bitstring(bitstring):
+    """ The only measured outcome must be the hidden bitstring, including the all-zero and all-one cases """
+    bv = BernsteinVazirani(len(bitstring), bitstring)
+    counts = bv.simulation(bv.algorithm())
+    assert list(counts) == [bitstring]
+
+
+def test_transpile_keeps_shallowest_of_seeds(monkeypatch):
+    """ best_of transpilations run in-process and the shallowest one is returned """
+    import BV_qiskit
+    from qiskit.providers.fake_provider import FakeGuadalupe
+
+    class FakeProvider:
+        def get_backend(self, name):
+            return FakeGuadalupe()
+
+    monkeypatch.setattr(BV_qiskit, '_ibmq_provider', lambda: FakeProvider())
+    qasm = BernsteinVazirani(5, '10110').algorithm().qasm()
+    best = BV_qiskit._transpile_cached.__wrapped__(qasm, 'fake_guadalupe', 3, 4)
+    # best_of=1 only runs seed 0, which is one of the candidates of best_of=4
+    seed_0 = BV_qiskit._transpile_cached.__wrapped__(qasm, 'fake_guadalupe', 3, 1)
+    assert best.depth() <= seed_0.depth()
+
+
+def test_simulate_batch_keeps_input_order():
+    bitstrings = ['001', '110', '011', '100']
+    circuits = [BernsteinVazirani(3, b).algorithm() for b in bitstrings]
+    counts = BernsteinVazirani.simulate_batch(circuits, shots=64)
+    assert [list(c) for c in counts] == [[b] for b in bitstrings]
@@ -1,8 +1,38 @@
 # Deutsch-Jozsa algorithm implementation with Qiskit
 # Main reference used: https://qiskit.org/textbook/ch-algorithms/deutsch-jozsa.html
 
+import functools
+import os
 import numpy as np
 import qiskit
+from qiskit.providers.aer import AerSimulator
+
+
+# Simulator backend, created once and shared by every simulation
+_QASM_SIM = qiskit.Aer.get_backend('aer_simulator')
+# Simulator used for batches of circuits, running the experiments of a job in parallel
+_BATCH_SIM = AerSimulator(max_parallel_experiments=os.cpu_count())
+
+
+@functools.lru_cache(maxsize=None)
+def _ibmq_provider():
+    """ Loads the IBMQ account once and returns the provider. """
+    qiskit.providers.ibmq.IBMQ.load_account()
+    return qiskit.providers.ibmq.IBMQ.get_provider(hub='ibm-q')
+
+
+@functools.lru_cache(maxsize=128)
+def _transpile_cached(qasm: str, backend_name: str, level: int, best_of: int = 1) -> qiskit.QuantumCircuit:
+    """ 
+        Transpiles the circuit described by the given QASM string, so that repeated runs of the same circuit skip the transpiler.
+        The transpiler is stochastic, so it is run best_of times with different seeds (Qiskit runs them in parallel) and the shallowest circuit is kept.
+    """
+    circuit = qiskit.QuantumCircuit.from_qasm_str(qasm)
+    backend = _ibmq_provider().get_backend(backend_name)
+    candidates = qiskit.transpile([circuit]*best_of, backend, optimization_level=level, seed_transpiler=list(range(best_of)))
+
+    # Keep the circuit with the lowest depth, using the number of CNOTs to break ties
+    return min(candidates, key=lambda c: (c.depth(), c.count_ops().get('cx', 0)))
 
 
 class DeutschJozsa():
@@ -18,6 +48,10 @@ class DeutschJozsa():
 
         self.type = type
         self.num_bits  = num_bits
+        # Simulator used by simulation(), shared between instances
+        self._sim = _QASM_SIM
+        # Random generator used to build the oracles
+        self._rng = np.random.default_rng()
 
     def oracle(self) -> qiskit.circuit.gate.Gate:
         """ Based on the type of oracle creates a quantum oracle with n input qubits and 1 output qubit. """
@@ -27,7 +61,7 @@ class DeutschJozsa():
         # CONSTANT ORACLE
         if self.type == 'constant':
             # Randomly set the output qubit to be 0 or 1
-            output = np.random.randint(2)
+            output = self._rng.integers(2)
             if output == 1:
                 circuit.x(self.num_bits)
 
@@ -35,23 +69,20 @@ class DeutschJozsa():
         # To create a balanced oracle we need to perform CNOTs with each input qubit as a control and the output bit as the target.
         # To vary the input state we wrap some of the controls in X-gates.
         if self.type == 'balanced':
-            # Randomly generate a binary string -> decides which controls to wrap
-            b = np.random.randint(1, 2**self.num_bits)
-            binary_string = format(b, '0' + str(self.num_bits) + 'b')
+            # Randomly generate a non-zero array of bits -> decides which controls to wrap
+            bits = self._rng.integers(0, 2, size=self.num_bits, dtype=np.uint8)
+            while not bits.any():
+                bits = self._rng.integers(0, 2, size=self.num_bits, dtype=np.uint8)
+            wrapped_qubits = np.flatnonzero(bits).tolist()
 
             # Place X-gates
-            for qubit in range(len(binary_string)):
-                if binary_string[qubit] == '1':
-                    circuit.x(qubit)
+            circuit.x(wrapped_qubits)
 
             # Controlled-NOT gates
-            for qubit in range(self.num_bits):
-                circuit.cx(qubit, self.num_bits)
+            circuit.cx(range(self.num_bits), [self.num_bits]*self.num_bits)
 
             # Place X-gates
-            for qubit in range(len(binary_string)):
-                if binary_string[qubit] == '1':
-                    circuit.x(qubit)
+            circuit.x(wrapped_qubits)
 
         # Create gate and name it
         oracle_gate = circuit.to_gate()
@@ -68,8 +99,7 @@ class DeutschJozsa():
         )
 
         # Put input qubits in state |+⟩, i.e. apply H-gates
-        for qubit in range(self.num_bits):
-            circuit.h(qubit)
+        circuit.h(range(self.num_bits))
 
         # Put output qubit in state |−⟩
         circuit.x(self.num_bits)
@@ -79,24 +109,17 @@ class DeutschJozsa():
         circuit.append(oracle, range(self.num_bits+1))
 
         # Repeat H-gates
-        for qubit in range(self.num_bits):
-            circuit.h(qubit)
+        circuit.h(range(self.num_bits))
 
         # Measure
-        for i in range(self.num_bits):
-            circuit.measure(i, i)
+        circuit.measure(range(self.num_bits), range(self.num_bits))
 
         return circuit
 
     def simulation(self, circuit: qiskit.QuantumCircuit, plot: bool):
         """ Performs simulation on the given circuit. """
-        # Get simulator and serialize qobj
-        qasm_simulator = qiskit.Aer.get_backend('qasm_simulator')
-        transpiled_circuit = qiskit.compiler.transpiler.transpile(circuit, qasm_simulator)
-        qobj = qiskit.compiler.assembler.assemble(transpiled_circuit)
-
-        # Get results
-        results = qasm_simulator.run(qobj).result()
+        # Get results (the oracle gate is unrolled into its X/CNOT gates, no transpilation is needed for the simulator)
+        results = self._sim.run(circuit.decompose('Oracle')).result()
         answer = results.get_counts()
 
         # Plot histogram if requested
@@ -105,16 +128,23 @@ class DeutschJozsa():
 
         return answer
 
-    def run_quantum_hardware(self, circuit: qiskit.QuantumCircuit, plot: bool):
-        """ Run the given circuit on the IBM quantum hardware in the cloud. """
+    @staticmethod
+    def simulate_batch(circuits: list, shots: int = 1024) -> list:
+        """ Performs simulation on all the given circuits in a single job and returns the counts of each circuit, in the same order. """
+        # Get results
+        results = _BATCH_SIM.run([circuit.decompose('Oracle') for circuit in circuits], shots=shots).result()
+
+        return [results.get_counts(i) for i in range(len(circuits))]
+
+    def run_quantum_hardware(self, circuit: qiskit.QuantumCircuit, plot: bool, best_of: int = 5):
+        """ Run the given circuit on the IBM quantum hardware in the cloud, keeping the shallowest of best_of transpilations. """
         # Load IBMQ account and get the least busy backend device with greater than or equal to (n+1) qubits
-        qiskit.providers.ibmq.IBMQ.load_account()
-        provider = qiskit.providers.ibmq.IBMQ.get_provider(hub='ibm-q')
+        provider = _ibmq_provider()
         backend = qiskit.providers.ibmq.least_busy(provider.backends(filters=lambda x: x.configuration().n_qubits >= (self.num_bits+1) and not x.configuration().simulator and x.status().operational == True))
         print('Least busy backend:', backend)
 
         # Run circuit on the least busy backend and monitor the execution of the job in the queue
-        transpiled_circuit = qiskit.transpile(circuit, backend, optimization_level=3)
+        transpiled_circuit = _transpile_cached(circuit.qasm(), backend.name(), 3, best_of)
         qobj = qiskit.assemble(transpiled_circuit, backend)
         job = backend.run(qobj)
         qiskit.tools.monitor.job_monitor(job, interval=2)
@@ -0,0 +1,36 @@
+# Tests for the Deutsch-Jozsa algorithm implementation with Qiskit
+
+import pytest
+
+pytest.importorskip('qiskit')
+
+from DJ_qiskit import DeutschJozsa
+
+
+@pytest.mark.parametrize('num_bits', [1, 2, 3])
+def test_constant_oracle_measures_all_zeros(num_bits):
+    dj = DeutschJozsa('constant', num_bits)
+    for _ in range(5):
+        counts = dj.simulation(dj.algorithm(dj.oracle()), plot=False)
+        assert list(counts) == ['0' * num_bits]
+
+
+@pytest.mark.parametrize('num_bits', [1, 2, 3])
+def test_balanced_oracle_never_measures_all_zeros(num_bits):
+    dj = DeutschJozsa('balanced', num_bits)
+    for _ in range(5):
+        counts = dj.simulation(dj.algorithm(dj.oracle()), plot=False)
+        assert '0' * num_bits not in counts
+
+
+def test_oracles_are_independent_gates():
+    """ Each call builds a new gate, so circuits never share a mutable oracle """
+    dj = DeutschJozsa('balanced', 3)
+    assert dj.oracle() is not dj.oracle()
+
+
+def test_simulate_batch_keeps_input_order():
+    constant, balanced = DeutschJozsa('constant', 3), DeutschJozsa('balanced', 3)
+    circuits = [dj.algorithm(dj.oracle()) for dj in (constant, balanced, balanced, constant)]
+    counts = DeutschJozsa.simulate_batch(circuits, shots=64)
+    assert ['000' in c for c in counts] == [True, False, False, True]
@@ -1,11 +1,56 @@
 # Quantum Fourier Transform implementation with Qiskit
 # Main resource used: https://qiskit.org/textbook/ch-algorithms/quantum-fourier-transform.html
 
+import functools
 import numpy as np
 import qiskit
+from qiskit.providers.aer import AerSimulator
 from qiskit.providers.ibmq import IBMQ, least_busy
 
 
+# Statevector simulator, created once and shared by every simulation
+_SV_SIM = AerSimulator(method='statevector')
+
+
+@functools.lru_cache(maxsize=None)
+def _gpu_sv_sim() -> AerSimulator:
+    """ Returns the GPU statevector simulator (requires qiskit-aer-gpu and CUDA). It is created on first use, as it fails on machines without a GPU. """
+    return AerSimulator(method='statevector', device='GPU', cuStateVec_enable=True)
+
+
+@functools.lru_cache(maxsize=None)
+def _ibmq_provider():
+    """ Loads the IBMQ account once and returns the provider. """
+    IBMQ.load_account()
+    return IBMQ.get_provider(hub='ibm-q')
+
+
+@functools.lru_cache(maxsize=128)
+def _transpile_cached(qasm: str, backend_name: str, level: int, best_of: int = 1) -> qiskit.QuantumCircuit:
+    """ 
+        Transpiles the circuit described by the given QASM string, so that repeated runs of the same circuit skip the transpiler.
+        The transpiler is stochastic, so it is run best_of times with different seeds (Qiskit runs them in parallel) and the shallowest circuit is kept.
+    """
+    circuit = qiskit.QuantumCircuit.from_qasm_str(qasm)
+    backend = _ibmq_provider().get_backend(backend_name)
+    candidates = qiskit.transpile([circuit]*best_of, backend, optimization_level=level, seed_transpiler=list(range(best_of)))
+
+    # Keep the circuit with the lowest depth, using the number of CNOTs to break ties
+    return min(candidates, key=lambda c: (c.depth(), c.count_ops().get('cx', 0)))
+
+
+@functools.lru_cache(maxsize=16)
+def _append_inverse(qasm: str, num_qubits: int) -> qiskit.QuantumCircuit:
+    """ Appends the inverse of the circuit described by the given QASM string to its first num_qubits qubits. """
+    circuit = qiskit.QuantumCircuit.from_qasm_str(qasm)
+    # Take the inverse of the circuit
+    inverse_qft_circuit = circuit.inverse()
+    # Add it to the first n qubits in existing circuit
+    circuit.append(inverse_qft_circuit, circuit.qubits[:num_qubits])
+    # No need to decompose: the transpiler unrolls the inverse block itself
+    return circuit
+
+
 class QuantumFourierTransform():
     """ Implements the Quantum Fourier Transform algorithm logic. """
     def __init__(
@@ -19,25 +64,21 @@ class QuantumFourierTransform():
 
     def rotations(self, circuit: qiskit.QuantumCircuit, n: int):
         """ Performs Quantum Fourier Transform on the first n qubits in circuit. """
-        # Exit function if circuit is empty
-        if n == 0:
-            return circuit
-        
-        # Reduce n because indexes start from 0
-        n -= 1
-        # Apply the Hadamard gate to the most significant qubit
-        circuit.h(n)
-
-        # For the less significant qubits -> apply smaller-angled controlled rotation
-        for qubit in range(n):
-            circuit.cp(
-                np.pi/(2**(n-qubit)), 
-                qubit, 
-                n
-            )
-        
-        # Call the function again with n reduced by 1 (it was done before in the function)
-        circuit = self.rotations(circuit, n)
+        # Precompute the rotation angles: angles[d-1] = π/2^d
+        angles = np.pi / np.power(2.0, np.arange(1, n))
+
+        # Start from the most significant qubit and move down to the least significant one
+        for top in range(n-1, -1, -1):
+            # Apply the Hadamard gate to the current qubit
+            circuit.h(top)
+
+            # For the less significant qubits -> apply smaller-angled controlled rotation
+            for qubit in range(top):
+                circuit.cp(
+                    angles[top-qubit-1], 
+                    qubit, 
+                    top
+                )
 
         return circuit
 
@@ -61,38 +102,39 @@ class QuantumFourierTransform():
 
         return circuit
 
-    def simulation(self, circuit: qiskit.QuantumCircuit, plot: bool = False):
-        """ Performs simulation on the given circuit and returns the statevector. """
-        # Get simulator and serialize qobj
-        sv_sim = qiskit.Aer.get_backend('statevector_simulator')
+    def simulation(self, circuit: qiskit.QuantumCircuit, plot: bool = False, device: str = 'cpu'):
+        """ Performs simulation on the given circuit and returns the statevector. With device='gpu' the simulation runs on cuStateVec, which pays off for large circuits (n ≥ 20). """
+        # Check if a valid device was passed
+        assert device == 'cpu' or device == 'gpu', f'device should be either cpu or gpu. {device} not allowed'
+        sv_sim = _gpu_sv_sim() if device == 'gpu' else _SV_SIM
+
+        # Save the final statevector on a copy, so the given circuit is left untouched
+        circuit = circuit.copy()
+        circuit.save_statevector()
         # Get statevector
-        statevector = sv_sim.run(qiskit.assemble(circuit)).result().get_statevector()
+        statevector = np.asarray(sv_sim.run(circuit, shots=1).result().data(0)['statevector'])
         # Plot bloch sphere if requested
         if plot:
             qiskit.visualization.plot_bloch_multivector(statevector)
 
         return statevector
 
-    def run_quantum_hardware(self, circuit: qiskit.QuantumCircuit, shots: int = 2048, plot: bool = False):
+    def run_quantum_hardware(self, circuit: qiskit.QuantumCircuit, shots: int = 2048, plot: bool = False, best_of: int = 5):
         """ 
             Run the given circuit on the IBM quantum hardware in the cloud. 
             We first create the state in Fourier basis, then run QFT in reverse and finally verify that the output corresponds to the expected computational basis.
+            The circuit is transpiled best_of times and the shallowest result is the one that gets executed.
         """
-        # Take the inverse of the circuit
-        inverse_qft_circuit = circuit.inverse()
-        # Add it to the first n qubits in existing circuit
-        circuit.append(inverse_qft_circuit, circuit.qubits[:self.n])
-        # Use decompose to see the individual gates
-        circuit = circuit.decompose()
+        # Add the inverse of the circuit to its first n qubits (cached, as it walks the whole circuit)
+        circuit = _append_inverse(circuit.qasm(), self.n)
 
         # Load IBMQ account and get the least busy backend device with greater than or equal to (n+1) qubits
-        IBMQ.load_account()
-        provider = IBMQ.get_provider(hub='ibm-q')
+        provider = _ibmq_provider()
         backend = least_busy(provider.backends(filters=lambda x: x.configuration().n_qubits >= self.n and not x.configuration().simulator and x.status().operational==True))       
         print('Least busy backend:', backend)
 
         # Run our circuit on the least busy backend and monitor the execution of the job in the queue
-        transpiled_circuit = qiskit.transpile(circuit, backend, optimization_level=3)
+        transpiled_circuit = _transpile_cached(circuit.qasm(), backend.name(), 3, best_of)
         qobj = qiskit.assemble(transpiled_circuit, shots=shots)
         job = backend.run(qobj)
         qiskit.tools.monitor.job_monitor(job)
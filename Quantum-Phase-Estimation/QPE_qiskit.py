@@ -1,8 +1,38 @@
 # Quantum Phase Estimation implementation with Qiskit
 # Main resource used: https://qiskit.org/textbook/ch-algorithms/quantum-phase-estimation.html
 
+import functools
 import math
+import os
 import qiskit
+from qiskit.providers.aer import AerSimulator
+
+
+# Simulator backend, created once and shared by every simulation
+_QASM_SIM = qiskit.Aer.get_backend('aer_simulator')
+# Simulator used for batches of circuits, running the experiments of a job in parallel
+_BATCH_SIM = AerSimulator(max_parallel_experiments=os.cpu_count())
+
+
+@functools.lru_cache(maxsize=None)
+def _ibmq_provider():
+    """ Loads the IBMQ account once and returns the provider. """
+    qiskit.IBMQ.load_account()
+    return qiskit.IBMQ.get_provider(hub='ibm-q')
+
+
+@functools.lru_cache(maxsize=128)
+def _transpile_cached(qasm: str, backend_name: str, level: int, best_of: int = 1) -> qiskit.QuantumCircuit:
+    """ 
+        Transpiles the circuit described by the given QASM string, so that repeated runs of the same circuit skip the transpiler.
+        The transpiler is stochastic, so it is run best_of times with different seeds (Qiskit runs them in parallel) and the shallowest circuit is kept.
+    """
+    circuit = qiskit.QuantumCircuit.from_qasm_str(qasm)
+    backend = _ibmq_provider().get_backend(backend_name)
+    candidates = qiskit.transpile([circuit]*best_of, backend, optimization_level=level, seed_transpiler=list(range(best_of)))
+
+    # Keep the circuit with the lowest depth, using the number of CNOTs to break ties
+    return min(candidates, key=lambda c: (c.depth(), c.count_ops().get('cx', 0)))
 
 
 class QuantumPhaseEstimation():
@@ -15,14 +45,19 @@ class QuantumPhaseEstimation():
         
         self.n_counting_qubits = n_counting_qubits
         self.angle = 2 * math.pi * angle
+        # Simulator used by simulation(), shared between instances
+        self._sim = _QASM_SIM
 
     def qft_inverse(self, circuit: qiskit.QuantumCircuit, n: int) -> qiskit.QuantumCircuit:
         """ Applies the inverse of the Quantum Fourier Transform on the first n qubits in the given circuit. """
-        for qubit in range(n//2):
-            circuit.swap(qubit, n-qubit-1)
+        # Precompute the rotation angles: angles[d-1] = -π/2^d
+        angles = [-math.pi / (1 << d) for d in range(1, n+1)]
+
+        if n//2 > 0:
+            circuit.swap(list(range(n//2)), list(range(n-1, n-1-n//2, -1)))
         for j in range(n):
             for m in range(j):
-                circuit.cp(-math.pi/float(2**(j-m)), m, j)
+                circuit.cp(angles[j-m-1], m, j)
             circuit.h(j)
 
         return circuit
@@ -38,17 +73,16 @@ class QuantumPhaseEstimation():
         circuit = qiskit.QuantumCircuit(self.n_counting_qubits+1, self.n_counting_qubits)
 
         # Apply Hadamard gate to counting qubits
-        for qubit in range(self.n_counting_qubits):
-            circuit.h(qubit)
+        circuit.h(range(self.n_counting_qubits))
         
         # Prepare the eigenstate |ψ⟩
         if eigenstate_x:
             circuit.x(self.n_counting_qubits)  # Applies the X-gate on the eigenstate (last qubit) if requested
 
         # Apply the controlled-U operation for "repetitions" times
+        # Controlled-phase gates are diagonal, so "repetitions" consecutive CP(θ) are merged into a single CP(repetitions·θ)
         for counting_qubit in range(self.n_counting_qubits):
-            for _ in range(repetitions):
-                circuit.cp(self.angle, counting_qubit, self.n_counting_qubits)
+            circuit.cp(self.angle * repetitions, counting_qubit, self.n_counting_qubits)
             repetitions *= 2
 
         # Apply visual barrier
@@ -61,8 +95,7 @@ class QuantumPhaseEstimation():
         circuit.barrier()
 
         # Apply measurement
-        for qubit in range(self.n_counting_qubits):
-            circuit.measure(qubit, qubit)
+        circuit.measure(range(self.n_counting_qubits), range(self.n_counting_qubits))
         
 
         # Print and draw circuit if requested
@@ -74,13 +107,8 @@ class QuantumPhaseEstimation():
 
     def simulation(self, circuit: qiskit.QuantumCircuit, shots: int = 4096, plot: bool = False):
         """ Performs simulation on the given circuit and returns the statevector. """
-        # Get simulator and serialize qobj
-        qasm_simulator = qiskit.Aer.get_backend('qasm_simulator')
-        transpiled_circuit = qiskit.transpile(circuit, qasm_simulator)
-        qobj = qiskit.assemble(transpiled_circuit, shots=shots)
-
         # Get results
-        results = qasm_simulator.run(qobj).result()
+        results = self._sim.run(circuit, shots=shots).result()
         counts = results.get_counts()
 
         # Plot histogram if requested
@@ -89,17 +117,24 @@ class QuantumPhaseEstimation():
 
         return counts
 
-    def run_quantum_hardware(self, circuit: qiskit.QuantumCircuit, shots: int = 2048, plot: bool = False):
-        """ Run the given circuit on the IBM quantum hardware in the cloud. """
+    @staticmethod
+    def simulate_batch(circuits: list, shots: int = 4096) -> list:
+        """ Performs simulation on all the given circuits in a single job and returns the counts of each circuit, in the same order. """
+        # Get results
+        results = _BATCH_SIM.run(circuits, shots=shots).result()
+
+        return [results.get_counts(i) for i in range(len(circuits))]
+
+    def run_quantum_hardware(self, circuit: qiskit.QuantumCircuit, shots: int = 2048, plot: bool = False, best_of: int = 5):
+        """ Run the given circuit on the IBM quantum hardware in the cloud, keeping the shallowest of best_of transpilations. """
         # Load IBMQ account and get the least busy backend device with greater than or equal to the required qubits
-        qiskit.IBMQ.load_account()
         from qiskit.tools.monitor import job_monitor
-        provider = qiskit.IBMQ.get_provider(hub='ibm-q')
+        provider = _ibmq_provider()
         backend = qiskit.providers.ibmq.least_busy(provider.backends(filters=lambda x: x.configuration().n_qubits >= self.n and not x.configuration().simulator and x.status().operational == True))
         print('Least busy backend:', backend)
 
         # Run circuit on the least busy backend and monitor the execution of the job in the queue
-        transpiled_circuit = qiskit.transpile(circuit, backend, optimization_level=3)
+        transpiled_circuit = _transpile_cached(circuit.qasm(), backend.name(), 3, best_of)
         qobj = qiskit.assemble(transpiled_circuit, shots=shots)
         job = backend.run(qobj)
         qiskit.tools.monitor.job_monitor(job)
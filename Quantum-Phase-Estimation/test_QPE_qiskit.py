@@ -0,0 +1,28 @@
+# Tests for the Quantum Phase Estimation implementation with Qiskit
+
+import pytest
+
+pytest.importorskip('qiskit')
+
+from QPE_qiskit import QuantumPhaseEstimation
+
+
+@pytest.mark.parametrize('n_counting_qubits', [1, 2, 3])
+def test_algorithm_builds(n_counting_qubits):
+    circuit = QuantumPhaseEstimation(n_counting_qubits, 0.25).algorithm()
+    assert circuit.num_qubits == n_counting_qubits + 1
+
+
+@pytest.mark.parametrize('angle, expected', [(0.25, '010'), (0.125, '001'), (0.5, '100')])
+def test_simulation_estimates_phase(angle, expected):
+    """ Phases that are exact multiples of 1/2^n are estimated exactly """
+    qpe = QuantumPhaseEstimation(3, angle)
+    counts = qpe.simulation(qpe.algorithm(eigenstate_x=True), shots=256)
+    assert list(counts) == [expected]
+
+
+def test_simulate_batch_keeps_input_order():
+    angles = [0.125, 0.5, 0.25, 0.75]
+    circuits = [QuantumPhaseEstimation(3, a).algorithm(eigenstate_x=True) for a in angles]
+    counts = QuantumPhaseEstimation.simulate_batch(circuits, shots=64)
+    assert [list(c) for c in counts] == [['001'], ['100'], ['010'], ['110']]
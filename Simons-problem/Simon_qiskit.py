@@ -1,12 +1,66 @@
 # Simon's algorithm implementation with Qiskit
 # Main resources used: https://qiskit.org/textbook/ch-algorithms/simon.html, https://github.com/qiskit-community/qiskit-community-tutorials/blob/master/algorithms/simon_algorithm.ipynb
 
+import functools
+import os
 import numpy as np
 import qiskit
 from qiskit import IBMQ
+from qiskit.providers.aer import AerSimulator
 from qiskit.providers.ibmq import least_busy
 
 
+# Simulator backend, created once and shared by every simulation
+_QASM_SIM = qiskit.Aer.get_backend('aer_simulator')
+# Simulator used for batches of circuits, running the experiments of a job in parallel
+_BATCH_SIM = AerSimulator(max_parallel_experiments=os.cpu_count())
+
+
+@functools.lru_cache(maxsize=None)
+def _ibmq_provider():
+    """ Loads the IBMQ account once and returns the provider. """
+    IBMQ.load_account()
+    return IBMQ.get_provider(hub='ibm-q')
+
+
+@functools.lru_cache(maxsize=128)
+def _transpile_cached(qasm: str, backend_name: str, level: int, best_of: int = 1) -> qiskit.QuantumCircuit:
+    """ 
+        Transpiles the circuit described by the given QASM string, so that repeated runs of the same circuit skip the transpiler.
+        The transpiler is stochastic, so it is run best_of times with different seeds (Qiskit runs them in parallel) and the shallowest circuit is kept.
+    """
+    circuit = qiskit.QuantumCircuit.from_qasm_str(qasm)
+    backend = _ibmq_provider().get_backend(backend_name)
+    candidates = qiskit.transpile([circuit]*best_of, backend, optimization_level=level, seed_transpiler=list(range(best_of)))
+
+    # Keep the circuit with the lowest depth, using the number of CNOTs to break ties
+    return min(candidates, key=lambda c: (c.depth(), c.count_ops().get('cx', 0)))
+
+
+@functools.lru_cache(maxsize=None)
+def _compiled_dots():
+    """ 
+        Compiles, on first use, the Numba kernel calculating the dot product (mod 2) of b with each row of z_bits, in parallel over the rows.
+        Returns None if Numba (optional) is not installed.
+    """
+    try:
+        import numba
+    except ImportError:
+        return None
+
+    @numba.njit(parallel=True, cache=True)
+    def dots(b_bits: np.ndarray, z_bits: np.ndarray) -> np.ndarray:
+        out = np.empty(z_bits.shape[0], np.uint8)
+        for k in numba.prange(z_bits.shape[0]):
+            s = 0
+            for i in range(b_bits.shape[0]):
+                s ^= b_bits[i] & z_bits[k, i]
+            out[k] = s
+        return out
+
+    return dots
+
+
 class SimonProblem():
     """ Implements the Simon's algorithm logic. """
     def __init__(
@@ -16,43 +70,57 @@ class SimonProblem():
         
         self.b = bitstring
         self.n = len(bitstring)
+        # Simulator used by simulation(), shared between instances
+        self._sim = _QASM_SIM
+        # Bits of b as an array, used to compute dot products
+        self._b_bits = self._to_bits(bitstring)
+
+    def _cycle_swaps(self, permutation: np.ndarray) -> list:
+        """ Returns the swaps (between second-register qubits) realizing the permutation, found by walking each of its cycles """
+        # A cycle of length L needs L-1 swaps
+        visited = np.zeros(self.n, dtype=bool)
+        swaps = []
+        for i in range(self.n):
+            if visited[i] or permutation[i] == i:
+                continue
+            j = i
+            while not visited[j]:
+                visited[j] = True
+                if permutation[j] != i:
+                    swaps.append((j, int(permutation[j])))
+                j = permutation[j]
+
+        return swaps
 
     def oracle(self, circuit: qiskit.QuantumCircuit):
         """ Builds the oracle for the circuit """
         # 1. Copy qubits in the first register to the second register
-        for i in range(self.n):
-            circuit.cx(i, self.n+i)
+        circuit.cx(range(self.n), range(self.n, 2*self.n))
 
         # 2. Create 1-to-1 or 2-to-1 mapping: If b is not all-zero with j being the last 1 in the bitstring and if x_j = 0 -> Then XOR the second register with b. Otherwise, do not change the second register
         # Get the index of the last 1 in bitstring
         j = self.b.rfind('1')
 
         # Flip the idx-th qubit (in the second register) if b_idx is 1
-        for idx, char in enumerate(self.b):
-            if char == '1' and j != -1:
-                circuit.cx(j, self.n+idx)
+        if j != -1:
+            targets = [self.n+idx for idx, char in enumerate(self.b) if char == '1']
+            circuit.cx([j]*len(targets), targets)
 
         # 3. Creating random permutation: Randomly permute and flip the qubits of the second register
         # Get random permutation of n qubits
-        permutation = list(np.random.permutation(self.n))
-
-        # Init initial position
-        initial_position = list(range(self.n))
-        i = 0
-        while i < self.n:
-            if initial_position[i] != permutation[i]:
-                k = permutation.index(initial_position[i])
-                # Swap qubits
-                circuit.swap(self.n+i, self.n+k)
-                # Mark swapped qubits
-                initial_position[i], initial_position[k] = initial_position[k], initial_position[i]
-            else:
-                i += 1
-                
+        permutation = np.random.permutation(self.n)
+
+        # Find the swaps realizing the permutation
+        swaps = self._cycle_swaps(permutation)
+
+        # Swap qubits (the identity permutation needs no swaps)
+        if swaps:
+            circuit.swap([self.n+a for a, _ in swaps], [self.n+b for _, b in swaps])
+
         # Randomly flip the qubits
-        for i in range(self.n):
-            if np.random.random() > 0.5:
-                circuit.x(self.n+i)
+        flips = np.flatnonzero(np.random.random(self.n) > 0.5)
+        if flips.size:
+            circuit.x((self.n + flips).tolist())
 
         return circuit
 
@@ -85,22 +153,36 @@ class SimonProblem():
 
         return simon_circuit
 
+    @staticmethod
+    def _to_bits(bitstring: str) -> np.ndarray:
+        """ Converts a string of 0s and 1s into an array of bits """
+        return np.frombuffer(bitstring.encode(), dtype=np.uint8) - ord('0')
+
     def bdotz(self, b, z):
         """ Utility function used to calculate the dot product of the given values b and z """
-        accum = 0
-        for i  in range(len(b)):
-            accum += int(b[i]) * int(z[i])
-        return accum % 2
+        b_bits = self._b_bits if b == self.b else self._to_bits(b)
+        return int(np.count_nonzero(b_bits & self._to_bits(z))) & 1
+
+    def _outcome_dots(self, outcomes: list) -> np.ndarray:
+        """ Calculates the dot product (mod 2) of b with each of the given measurement outcomes at once """
+        # Stack the outcomes in a (k x n) matrix of bits
+        z_bits = self._to_bits(''.join(outcomes)).reshape(-1, self.n)
+        return (z_bits @ self._b_bits) & 1
+
+    def bdotz_batch(self, z_bits: np.ndarray) -> np.ndarray:
+        """ 
+            Calculates the dot product (mod 2) of b with each row of the given (k x n) matrix of bits, for sweep studies over many outcomes.
+            Uses a compiled Numba kernel when Numba is installed: the first call in a process pays the compilation, so it only pays off for very large batches.
+        """
+        dots = _compiled_dots()
+        if dots is not None:
+            return dots(self._b_bits, np.ascontiguousarray(z_bits, dtype=np.uint8))
+        return (z_bits @ self._b_bits) & 1
 
     def simulation(self, circuit, shots: int = 1024, plot: bool = False):
         """ Performs simulation on the given circuit. """
-        # Get simulator and serialize qobj
-        qasm_simulator = qiskit.Aer.get_backend('qasm_simulator')
-        # transpiled_circuit = qiskit.transpile(circuit, qasm_simulator)
-        qobj = qiskit.assemble(circuit, shots=shots)
-
         # Get results
-        results = qasm_simulator.run(qobj).result()
+        results = self._sim.run(circuit, shots=shots).result()
         counts = results.get_counts()
 
         # Plot histogram if requested
@@ -108,21 +190,29 @@ class SimonProblem():
             qiskit.visualization.plot_histogram(counts)
 
         # Print results
-        for z in counts:
-            print(f'{self.b}•{z} = {self.bdotz(self.b, z)} (mod 2)')        
+        outcomes = list(counts)
+        for z, dot in zip(outcomes, self._outcome_dots(outcomes)):
+            print(f'{self.b}•{z} = {dot} (mod 2)')
 
         return counts
 
-    def run_quantum_hardware(self, circuit, shots: int = 1024, plot: bool = False):
-        """ Run the given circuit on the IBM quantum hardware in the cloud. """
+    @staticmethod
+    def simulate_batch(circuits: list, shots: int = 1024) -> list:
+        """ Performs simulation on all the given circuits in a single job and returns the counts of each circuit, in the same order. """
+        # Get results
+        results = _BATCH_SIM.run(circuits, shots=shots).result()
+
+        return [results.get_counts(i) for i in range(len(circuits))]
+
+    def run_quantum_hardware(self, circuit, shots: int = 1024, plot: bool = False, best_of: int = 5):
+        """ Run the given circuit on the IBM quantum hardware in the cloud, keeping the shallowest of best_of transpilations. """
         # Load IBMQ account and get the least busy backend device with greater than or equal to (n+1) qubits
-        IBMQ.load_account()
-        provider = IBMQ.get_provider(hub='ibm-q')
+        provider = _ibmq_provider()
         backend = least_busy(provider.backends(filters=lambda x: x.configuration().n_qubits >= self.n and not x.configuration().simulator and x.status().operational == True))
         print('Least busy backend:', backend)
 
         # Run our circuit on the least busy backend and monitor the execution of the job in the queue
-        transpiled_circuit = qiskit.transpile(circuit, backend, optimization_level=3)
+        transpiled_circuit = _transpile_cached(circuit.qasm(), backend.name(), 3, best_of)
         qobj = qiskit.assemble(transpiled_circuit, shots=shots)
         job = backend.run(qobj)
         qiskit.tools.monitor.job_monitor(job, interval=2)
@@ -136,7 +226,8 @@ class SimonProblem():
 
         # Print results
         print('b = ' + self.b)
-        for z in results:
-            print(f'{self.b}•{z} = {self.bdotz(self.b, z)} (mod 2) ({(results[z]*100/shots):.1f}%)')
+        outcomes = list(results)
+        for z, dot in zip(outcomes, self._outcome_dots(outcomes)):
+            print(f'{self.b}•{z} = {dot} (mod 2) ({(results[z]*100/shots):.1f}%)')
 
         return results
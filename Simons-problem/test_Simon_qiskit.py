@@ -0,0 +1,43 @@
+# Tests for Simon's algorithm implementation with Qiskit
+
+import pytest
+
+pytest.importorskip('qiskit')
+
+from Simon_qiskit import SimonProblem
+
+
+@pytest.mark.parametrize('bitstring', ['0', '1', '00', '10', '11', '000', '101', '110'])
+def test_oracle_builds_for_small_n(bitstring):
+    """ The random permutation and flips are often empty for small n, building the circuit must never fail """
+    simon = SimonProblem(bitstring)
+    for _ in range(200):
+        circuit = simon.algorithm(draw=False)
+        assert circuit.num_qubits == 2 * len(bitstring)
+
+
+def test_bdotz():
+    """ bdotz is the parity of the bitwise AND of b and z """
+    simon = SimonProblem('101')
+    for z in ('000', '001', '010', '011', '100', '101', '110', '111'):
+        expected = sum(int(b) * int(c) for b, c in zip('101', z)) % 2
+        assert simon.bdotz('101', z) == expected
+        assert simon.bdotz('011', z) == sum(int(b) * int(c) for b, c in zip('011', z)) % 2
+
+
+def test_bdotz_batch_matches_bdotz():
+    """ The batch helper must agree with bdotz on every outcome """
+    np = pytest.importorskip('numpy')
+    simon = SimonProblem('1011')
+    outcomes = [format(z, '04b') for z in range(16)]
+    z_bits = np.array([[int(c) for c in z] for z in outcomes], dtype=np.uint8)
+    assert simon.bdotz_batch(z_bits).tolist() == [simon.bdotz('1011', z) for z in outcomes]
+
+
+def test_simulate_batch_keeps_input_order():
+    """ Every outcome z of the circuit for b satisfies b•z = 0 (mod 2), with qiskit's reversed bit order """
+    bitstrings = ['110', '011', '100', '001']
+    problems = [SimonProblem(b) for b in bitstrings]
+    counts = SimonProblem.simulate_batch([p.algorithm(draw=False) for p in problems], shots=256)
+    for problem, c in zip(problems, counts):
+        assert all(problem.bdotz(problem.b, z[::-1]) == 0 for z in c)